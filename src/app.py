@@ -1,6 +1,5 @@
 import dash
 from dash import dcc, html, Input, Output
-import xarray as xr
 import numpy as np
 import plotly.graph_objects as go
 from sklearn.metrics import r2_score
@@ -11,6 +10,11 @@ import plotly.io as pio
 import dash_bootstrap_components as dbc
 from dash_bootstrap_templates import ThemeSwitchAIO, load_figure_template
 
+try:
+    from .memory_policy import load_memory_config, load_scenarios, report_memory, kpi_values, kpi_stats, kpi_range
+except ImportError:
+    from memory_policy import load_memory_config, load_scenarios, report_memory, kpi_values, kpi_stats, kpi_range
+
 # Load the figure templates for the themes
 load_figure_template(["bootstrap", "darkly"])
 
@@ -24,13 +28,22 @@ base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 kpi_options = kpi_config['kpi_options']
 kpi_descriptions = kpi_config['kpi_descriptions']
 
+# Load the dtype and memory policy
+memory_policy = load_memory_config()
+
 # Paths to datasets
 statusquo_file_path = os.path.join(base_dir, 'data', 'statusquo', 'Playground_2024-07-06_04.00.00_light_updated.nc')
 optimized_file_path = os.path.join(base_dir, 'data', 'opti', 'Playground_2024-07-06_04.00.00_light_updated.nc')
 
-# Load datasets
-ds_statusquo = xr.open_dataset(statusquo_file_path)
-ds_optimized = xr.open_dataset(optimized_file_path)
+# Load datasets within the memory budget and report what is held per scenario/KPI
+datasets = load_scenarios(
+    {'statusquo': statusquo_file_path, 'optimized': optimized_file_path},
+    kpi_options,
+    memory_policy
+)
+report_memory(datasets)
+ds_statusquo = datasets['statusquo']
+ds_optimized = datasets['optimized']
 time_steps = ds_statusquo['Time'].values
 vertical_levels = list(ds_statusquo['GridsK'].values)
 
@@ -40,10 +53,8 @@ server = app.server
 
 # Function to calculate global min and max
 def get_global_range(kpi):
-    statusquo_min = float(ds_statusquo[kpi].min().values)
-    statusquo_max = float(ds_statusquo[kpi].max().values)
-    optimized_min = float(ds_optimized[kpi].min().values)
-    optimized_max = float(ds_optimized[kpi].max().values)
+    statusquo_min, statusquo_max = kpi_range(ds_statusquo, kpi, memory_policy)
+    optimized_min, optimized_max = kpi_range(ds_optimized, kpi, memory_policy)
     global_min = min(statusquo_min, optimized_min)
     global_max = max(statusquo_max, optimized_max)
     return global_min, global_max
@@ -162,14 +173,8 @@ def update_graphs(selected_kpi, selected_time, selected_level, toggle):
     # Function to compute mean, min, and max for hourly plot dynamically
     def compute_hourly_stats(ds, kpi, has_grids_k):
         if has_grids_k:
-            mean = ds[kpi].mean(dim=['GridsI', 'GridsJ', 'GridsK']).values
-            min_val = ds[kpi].min(dim=['GridsI', 'GridsJ', 'GridsK']).values
-            max_val = ds[kpi].max(dim=['GridsI', 'GridsJ', 'GridsK']).values
-        else:
-            mean = ds[kpi].mean(dim=['GridsI', 'GridsJ']).values
-            min_val = ds[kpi].min(dim=['GridsI', 'GridsJ']).values
-            max_val = ds[kpi].max(dim=['GridsI', 'GridsJ']).values
-        return mean, min_val, max_val
+            return kpi_stats(ds, kpi, memory_policy, ['GridsI', 'GridsJ', 'GridsK'])
+        return kpi_stats(ds, kpi, memory_policy, ['GridsI', 'GridsJ'])
 
     # Determine if the KPI has a GridsK dimension (i.e., it's 3D)
     has_grids_k = 'GridsK' in ds_statusquo[selected_kpi].dims
@@ -180,15 +185,15 @@ def update_graphs(selected_kpi, selected_time, selected_level, toggle):
         selected_level_idx = int(np.argmin(np.abs(ds_statusquo['GridsK'].values - float(selected_level))))
 
         # Assign data for the heatmaps using the nearest GridsK index
-        statusquo_data = ds_statusquo[selected_kpi].isel(Time=selected_time, GridsK=selected_level_idx).values
-        optimized_data = ds_optimized[selected_kpi].isel(Time=selected_time, GridsK=selected_level_idx).values
+        statusquo_data = kpi_values(ds_statusquo, selected_kpi, memory_policy, Time=selected_time, GridsK=selected_level_idx)
+        optimized_data = kpi_values(ds_optimized, selected_kpi, memory_policy, Time=selected_time, GridsK=selected_level_idx)
 
         # Show vertical level dropdown if GridsK dimension exists
         dropdown_style = {'display': 'block'}
     else:
         # For 2D KPIs, no need to handle GridsK
-        statusquo_data = ds_statusquo[selected_kpi].isel(Time=selected_time).values
-        optimized_data = ds_optimized[selected_kpi].isel(Time=selected_time).values
+        statusquo_data = kpi_values(ds_statusquo, selected_kpi, memory_policy, Time=selected_time)
+        optimized_data = kpi_values(ds_optimized, selected_kpi, memory_policy, Time=selected_time)
 
     # Compute hourly statistics (mean, min, max) for both status quo and optimized scenarios
     statusquo_hourly_mean, statusquo_hourly_min, statusquo_hourly_max = compute_hourly_stats(ds_statusquo, selected_kpi, has_grids_k)
@@ -198,8 +203,9 @@ def update_graphs(selected_kpi, selected_time, selected_level, toggle):
     statusquo_flat = statusquo_data.flatten()
     optimized_flat = optimized_data.flatten()
     mask = ~np.isnan(statusquo_flat) & ~np.isnan(optimized_flat)
-    statusquo_filtered = statusquo_flat[mask]
-    optimized_filtered = optimized_flat[mask]
+    # R² sums squared residuals, so accumulate it in the accumulation dtype
+    statusquo_filtered = statusquo_flat[mask].astype(memory_policy['accumulation_dtype'])
+    optimized_filtered = optimized_flat[mask].astype(memory_policy['accumulation_dtype'])
     
     r2 = r2_score(statusquo_filtered, optimized_filtered) if len(statusquo_filtered) > 0 else float('nan')
 
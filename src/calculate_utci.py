@@ -1,31 +1,36 @@
 import xarray as xr
 import numpy as np
-from utci_calculator import extract_and_calculate_utci
+from utci_calculator import extract_and_calculate_utci, resolve_levels
 import os
+from memory_policy import load_memory_config
+
+# Pedestrian (biomet) height in metres at which the 2D UTCI is computed
+PEDESTRIAN_HEIGHT = 1.4
 
 # Function to add UTCI to a dataset
-def add_utci_to_dataset(ds):
+def add_utci_to_dataset(ds, height=PEDESTRIAN_HEIGHT, storage_dtype=np.float32):
+    # height: a single height in metres; use calculate_utci_4D for 'all' or a list of levels
+    if isinstance(height, str) or np.ndim(height) != 0:
+        raise ValueError(f"The 2D UTCI needs a single height in metres, got {height!r}")
+
+    # Only the GridsK level nearest to the target height is read and computed
+    level_index = resolve_levels(ds, height)[0]
+    level_height = float(ds['GridsK'].values[level_index])
+    print(f"Calculating UTCI at GridsK level {level_index} ({level_height} m) for target height {height} m")
+
     utci_values = []
     for t in range(len(ds['Time'])):
         print(f"Calculating UTCI for time index {t}")
-        utci = extract_and_calculate_utci(ds, t)
-        
-        # Check the shape of utci
-        print(f"Original shape of UTCI at time index {t}: {utci.shape}")
-        
-        # Ensure it is 2D by selecting the appropriate slice if needed
-        if len(utci.shape) > 2:
-            utci = utci[0]  # Select the first slice if there's an extra dimension
-            print(f"Adjusted shape of UTCI at time index {t}: {utci.shape}")
-        
+        utci = extract_and_calculate_utci(ds, t, level_index)
         utci_values.append(utci)
     
     # Convert list of 2D arrays into a 3D array
     utci_array = xr.DataArray(
-        data=np.array(utci_values),  # Should have shape (Time, GridsJ, GridsI)
+        data=np.array(utci_values, dtype=storage_dtype),  # Should have shape (Time, GridsJ, GridsI)
         dims=('Time', 'GridsJ', 'GridsI'),
         coords={'Time': ds['Time'], 'GridsJ': ds['GridsJ'], 'GridsI': ds['GridsI']},
-        name='UTCI'
+        name='UTCI',
+        attrs={'target_height': height, 'level_height': level_height, 'level_index': level_index}
     )
     
     # Add UTCI to the dataset
@@ -43,8 +48,9 @@ ds_statusquo = xr.open_dataset(statusquo_file_path)
 ds_optimized = xr.open_dataset(optimized_file_path)
 
 # Add UTCI to the datasets
-ds_statusquo = add_utci_to_dataset(ds_statusquo)
-ds_optimized = add_utci_to_dataset(ds_optimized)
+storage_dtype = load_memory_config()['storage_dtype']
+ds_statusquo = add_utci_to_dataset(ds_statusquo, storage_dtype=storage_dtype)
+ds_optimized = add_utci_to_dataset(ds_optimized, storage_dtype=storage_dtype)
 
 """
 # Save the updated datasets
@@ -1,27 +1,43 @@
 import xarray as xr
 import numpy as np
 from utci_calculator_4D import extract_and_calculate_utci
+from utci_calculator import resolve_levels
 import os
+from memory_policy import load_memory_config
 
 # Function to add UTCI to a dataset
-def add_utci_to_dataset(ds):
+def add_utci_to_dataset(ds, levels='all', storage_dtype=np.float32):
+    # levels: 'all', a height in metres or a list of heights, each mapped to the nearest GridsK level
+    level_indices = resolve_levels(ds, levels)
+    level_heights = ds['GridsK'].isel(GridsK=level_indices)
+    print(f"Calculating UTCI at GridsK levels {level_indices}")
+
+    # Skip the indexed copy of every input when all levels are requested
+    extract_indices = None if len(level_indices) == len(ds['GridsK']) else level_indices
+
     utci_values = []
     for t in range(len(ds['Time'])):
         print(f"Calculating UTCI for time index {t}")
-        utci = extract_and_calculate_utci(ds, t)
+        utci = extract_and_calculate_utci(ds, t, extract_indices)
         
         # Check the shape of utci
         print(f"Shape of UTCI at time index {t}: {utci.shape}")
         
-        # Append the full 3D UTCI array for each time index
+        # Append the 3D UTCI array for each time index
         utci_values.append(utci)
     
     # Convert list of 3D arrays into a 4D array (Time, GridsK, GridsJ, GridsI)
     utci_array = xr.DataArray(
-        data=np.array(utci_values),  # Should have shape (Time, GridsK, GridsJ, GridsI)
+        data=np.array(utci_values, dtype=storage_dtype),  # Should have shape (Time, GridsK, GridsJ, GridsI)
         dims=('Time', 'GridsK', 'GridsJ', 'GridsI'),
-        coords={'Time': ds['Time'], 'GridsK': ds['GridsK'], 'GridsJ': ds['GridsJ'], 'GridsI': ds['GridsI']},
-        name='UTCI'
+        coords={'Time': ds['Time'], 'GridsK': level_heights, 'GridsJ': ds['GridsJ'], 'GridsI': ds['GridsI']},
+        name='UTCI',
+        attrs={
+            'target_levels': str(levels),
+            'level_indices': level_indices,
+            # Heights with computed UTCI; the other GridsK levels are NaN once aligned to the dataset
+            'level_heights': [float(height) for height in level_heights.values]
+        }
     )
     
     # Add UTCI to the dataset
@@ -39,8 +55,9 @@ ds_statusquo = xr.open_dataset(statusquo_file_path)
 ds_optimized = xr.open_dataset(optimized_file_path)
 
 # Add UTCI to the datasets
-ds_statusquo = add_utci_to_dataset(ds_statusquo)
-ds_optimized = add_utci_to_dataset(ds_optimized)
+storage_dtype = load_memory_config()['storage_dtype']
+ds_statusquo = add_utci_to_dataset(ds_statusquo, storage_dtype=storage_dtype)
+ds_optimized = add_utci_to_dataset(ds_optimized, storage_dtype=storage_dtype)
 
 # Save the updated datasets
 ds_statusquo.to_netcdf(os.path.join(base_dir, 'data', 'statusquo', 'Playground_2024-07-06_04.00.00_light_updated.nc'))
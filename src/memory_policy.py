@@ -0,0 +1,208 @@
+import os
+import json
+import numpy as np
+import xarray as xr
+
+# Load the memory configuration from the JSON file next to the KPI config
+config_dir = os.path.join(os.path.dirname(__file__), 'config')
+json_config_path = os.path.join(config_dir, 'memory_config.json')
+
+def load_memory_config():
+    """
+    Loads the dtype and memory policy. The memory budget can be overridden
+    with the MEMORY_BUDGET_MB environment variable (e.g. per container).
+    """
+    with open(json_config_path, 'r') as f:
+        policy = json.load(f)
+
+    budget_override = os.environ.get('MEMORY_BUDGET_MB')
+    if budget_override:
+        policy['memory_budget_mb'] = float(budget_override)
+    return policy
+
+def is_packed(da):
+    """
+    Returns True if the array is held in scale/offset compressed form.
+    """
+    return 'packed_scale' in da.attrs
+
+def time_slice_index(da, t):
+    """
+    Returns the numpy index selecting time step t of an array with a Time dimension.
+    """
+    return (slice(None),) * da.get_axis_num('Time') + (t,)
+
+def pack_scale_offset(da, packed_dtype):
+    """
+    Compresses a float array into integers using a linear scale and offset.
+    NaNs are stored as the smallest integer of the packed dtype. The array is
+    read one time step at a time so only a single slice is held as float64.
+    """
+    info = np.iinfo(packed_dtype)
+    n_time = da.sizes['Time']
+
+    # First pass: global range of the valid values
+    vmin, vmax = np.inf, -np.inf
+    for t in range(n_time):
+        values = da.isel(Time=t).values
+        if not np.isnan(values).all():
+            vmin = min(vmin, float(np.nanmin(values)))
+            vmax = max(vmax, float(np.nanmax(values)))
+    if vmin > vmax:
+        vmin = vmax = 0.0
+
+    n_steps = float(info.max) - float(info.min + 1)
+    scale = (vmax - vmin) / n_steps if vmax > vmin else 1.0
+    offset = vmin - (info.min + 1) * scale
+
+    # Second pass: pack each time step, computing in place on a single float64 slice
+    packed = np.full(da.shape, info.min, dtype=packed_dtype)
+    for t in range(n_time):
+        values = np.array(da.isel(Time=t).values, dtype=np.float64)
+        valid = np.isnan(values)
+        np.logical_not(valid, out=valid)
+        np.subtract(values, offset, out=values)
+        np.divide(values, scale, out=values)
+        np.round(values, out=values)
+        np.copyto(packed[time_slice_index(da, t)], values, casting='unsafe', where=valid)
+
+    attrs = dict(da.attrs, packed_scale=scale, packed_offset=offset, packed_fill=int(info.min))
+    return xr.DataArray(packed, dims=da.dims, coords=da.coords, name=da.name, attrs=attrs)
+
+def unpack_scale_offset(values, attrs, storage_dtype):
+    """
+    Restores packed integer values to floats in the storage dtype.
+    """
+    result = values.astype(storage_dtype) * storage_dtype(attrs['packed_scale']) + storage_dtype(attrs['packed_offset'])
+    result[values == attrs['packed_fill']] = np.nan
+    return result
+
+def estimate_nbytes(ds, kpis, policy):
+    """
+    Estimates the peak bytes needed to load the KPIs under the dtype policy:
+    the final size of all KPIs plus the largest temporary copy made while
+    loading a single KPI.
+    """
+    storage_dtype = np.dtype(policy['storage_dtype'])
+    packed_itemsize = np.dtype(policy['packed_dtype']).itemsize
+
+    total = 0
+    largest_temporary = 0
+    for kpi in kpis:
+        da = ds[kpi]
+        if policy['compress_2d_kpis'] and 'GridsK' not in da.dims:
+            total += da.size * packed_itemsize
+            # One time step read from disk, its float64 copy and its NaN mask while packing
+            slice_size = da.size // da.sizes['Time']
+            temporary = slice_size * (da.dtype.itemsize + np.dtype(np.float64).itemsize + np.dtype(bool).itemsize)
+        else:
+            total += da.size * storage_dtype.itemsize
+            # The on-disk array is held alongside the cast copy when the dtypes differ
+            temporary = da.size * da.dtype.itemsize if da.dtype != storage_dtype else 0
+        largest_temporary = max(largest_temporary, temporary)
+    return total + largest_temporary
+
+def apply_dtype_policy(ds, kpis, policy):
+    """
+    Loads the KPIs into memory in the storage dtype, packing the 2D KPIs
+    with scale/offset when compression is enabled.
+    """
+    storage_dtype = np.dtype(policy['storage_dtype'])
+
+    for kpi in kpis:
+        da = ds[kpi]
+        if policy['compress_2d_kpis'] and 'GridsK' not in da.dims:
+            ds[kpi] = pack_scale_offset(da, policy['packed_dtype'])
+        else:
+            # No copy is made when the data is already in the storage dtype
+            ds[kpi] = da.copy(data=da.values.astype(storage_dtype, copy=False))
+    return ds
+
+def load_scenarios(file_paths, kpis, policy):
+    """
+    Opens every scenario and loads its KPIs into memory while they fit in
+    the memory budget. Scenarios that would exceed it stay lazily loaded and
+    are read from disk on access without being cached.
+    """
+    remaining = policy['memory_budget_mb'] * 1024 ** 2
+    datasets = {}
+
+    for scenario, file_path in file_paths.items():
+        # cache=False keeps lazy variables from being held in memory after the first read
+        ds = xr.open_dataset(file_path, cache=False)
+        available_kpis = [kpi for kpi in kpis if kpi in ds.variables]
+        ds = ds[available_kpis]
+
+        required = estimate_nbytes(ds, available_kpis, policy)
+        if required <= remaining:
+            ds = apply_dtype_policy(ds, available_kpis, policy)
+            ds.attrs['memory_mode'] = 'loaded'
+            remaining -= sum(ds[kpi].nbytes for kpi in available_kpis)
+        else:
+            print(f"Memory budget exceeded for {scenario} "
+                  f"({required / 1024 ** 2:.1f} MB needed, {remaining / 1024 ** 2:.1f} MB left); using lazy loading")
+            ds.attrs['memory_mode'] = 'lazy'
+
+        datasets[scenario] = ds
+    return datasets
+
+def report_memory(datasets):
+    """
+    Prints the bytes held in memory per scenario and KPI.
+    """
+    grand_total = 0
+    for scenario, ds in datasets.items():
+        mode = ds.attrs.get('memory_mode', 'lazy')
+        print(f"Scenario '{scenario}' ({mode}):")
+
+        scenario_total = 0
+        for kpi, da in ds.data_vars.items():
+            held = da.nbytes if mode == 'loaded' else 0
+            scenario_total += held
+            packed = ' packed' if is_packed(da) else ''
+            print(f"  {kpi:<18} {str(da.dtype) + packed:<14} {held / 1024 ** 2:10.2f} MB")
+
+        print(f"  {'Total':<18} {'':<14} {scenario_total / 1024 ** 2:10.2f} MB")
+        grand_total += scenario_total
+    print(f"Total memory held by scenarios: {grand_total / 1024 ** 2:.2f} MB")
+
+def kpi_values(ds, kpi, policy, **indexers):
+    """
+    Extracts KPI values for the given indexers as an array in the storage dtype.
+    """
+    storage_dtype = np.dtype(policy['storage_dtype']).type
+    da = ds[kpi].isel(**indexers)
+    if is_packed(da):
+        return unpack_scale_offset(da.values, da.attrs, storage_dtype)
+    return da.values.astype(storage_dtype, copy=False)
+
+def kpi_stats(ds, kpi, policy, dims):
+    """
+    Computes the mean, min and max of a KPI over the given dimensions for
+    every time step. Time steps are processed one at a time, so lazy and
+    packed data never need more than one slice in memory. The mean is
+    accumulated in the accumulation dtype.
+    """
+    slice_dims = [dim for dim in ds[kpi].dims if dim != 'Time']
+    means, mins, maxs = [], [], []
+    for t in range(ds.sizes['Time']):
+        da = xr.DataArray(kpi_values(ds, kpi, policy, Time=t), dims=slice_dims)
+        means.append(da.mean(dim=dims, dtype=policy['accumulation_dtype']).values)
+        mins.append(da.min(dim=dims).values)
+        maxs.append(da.max(dim=dims).values)
+    return np.array(means), np.array(mins), np.array(maxs)
+
+def kpi_range(ds, kpi, policy):
+    """
+    Returns the global min and max of a KPI, reading one time step at a time.
+    """
+    global_min, global_max = np.inf, -np.inf
+    for t in range(ds.sizes['Time']):
+        values = kpi_values(ds, kpi, policy, Time=t)
+        valid = values[~np.isnan(values)]
+        if valid.size:
+            global_min = min(global_min, float(valid.min()))
+            global_max = max(global_max, float(valid.max()))
+    if global_min > global_max:
+        return float('nan'), float('nan')
+    return global_min, global_max
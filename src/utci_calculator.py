@@ -1,11 +1,47 @@
 import numpy as np
 from pythermalcomfort.models import utci
 
-def extract_kpi_data(ds, kpi_name, time_index):
+def resolve_levels(ds, levels):
+    """
+    Maps a target-level spec to GridsK indices.
+    :param levels: 'all', a height in metres (nearest GridsK level) or a list of heights
+    :return: sorted list of unique GridsK indices
+    """
+    heights = ds['GridsK'].values
+    if isinstance(levels, str):
+        if levels != 'all':
+            raise ValueError(f"Unknown level spec '{levels}', expected 'all', a height or a list of heights")
+        return list(range(len(heights)))
+
+    # Local grid spacing, used to reject heights outside the vertical grid
+    spacing = np.gradient(heights) if len(heights) > 1 else np.full(len(heights), np.inf)
+
+    targets = np.atleast_1d(levels)
+    if targets.size == 0:
+        raise ValueError("No target heights given, expected 'all', a height or a list of heights")
+
+    indices = set()
+    for level in targets:
+        if not np.isfinite(float(level)):
+            raise ValueError(f"Target height {level} m is not a finite number")
+        index = int(np.argmin(np.abs(heights - float(level))))
+        if abs(heights[index] - float(level)) > abs(spacing[index]):
+            raise ValueError(
+                f"Target height {level} m is more than one grid spacing from the nearest GridsK level "
+                f"({heights[index]} m)"
+            )
+        indices.add(index)
+    return sorted(indices)
+
+def extract_kpi_data(ds, kpi_name, time_index, level_index=None):
     """
     Extracts data for a specific KPI from the dataset at a given time index.
+    Only the requested GridsK levels are read for 3D KPIs.
     """
-    return ds[kpi_name].isel(Time=time_index).values
+    da = ds[kpi_name].isel(Time=time_index)
+    if level_index is not None and 'GridsK' in da.dims:
+        da = da.isel(GridsK=level_index)
+    return da.values
 
 def calculate_utci(air_temp, wind_speed, rel_humidity, mrt):
     """
@@ -22,14 +58,14 @@ def calculate_utci(air_temp, wind_speed, rel_humidity, mrt):
         print(f"Error calculating UTCI: {e}")
         return None
 
-def extract_and_calculate_utci(ds, time_index):
+def extract_and_calculate_utci(ds, time_index, level_index=None):
     """
-    Extracts required data and calculates UTCI.
+    Extracts required data and calculates UTCI for the given GridsK level(s).
     """
-    air_temp = extract_kpi_data(ds, 'T', time_index)
-    wind_speed = extract_kpi_data(ds, 'WindSpd', time_index)
-    rel_humidity = extract_kpi_data(ds, 'RelHum', time_index)
-    mrt = extract_kpi_data(ds, 'TMRT', time_index)
+    air_temp = extract_kpi_data(ds, 'T', time_index, level_index)
+    wind_speed = extract_kpi_data(ds, 'WindSpd', time_index, level_index)
+    rel_humidity = extract_kpi_data(ds, 'RelHum', time_index, level_index)
+    mrt = extract_kpi_data(ds, 'TMRT', time_index, level_index)
     
     utci = calculate_utci(air_temp, wind_speed, rel_humidity, mrt)
     return utci
@@ -2,11 +2,15 @@
 import numpy as np
 from pythermalcomfort.models import utci
 
-def extract_kpi_data(ds, kpi_name):
+def extract_kpi_data(ds, kpi_name, time_index, level_indices=None):
     """
-    Extracts 3D data for a specific KPI from the dataset without slicing.
+    Extracts 3D data for a specific KPI at a given time index.
+    Only the requested GridsK levels are read; None keeps all levels.
     """
-    return ds[kpi_name].values  # Keep the full 3D data
+    da = ds[kpi_name].isel(Time=time_index)
+    if level_indices is not None and 'GridsK' in da.dims:
+        da = da.isel(GridsK=level_indices)
+    return da.values
 
 def calculate_utci(air_temp, wind_speed, rel_humidity, mrt):
     """
@@ -24,14 +28,15 @@ def calculate_utci(air_temp, wind_speed, rel_humidity, mrt):
         print(f"Error calculating UTCI: {e}")
         return None
 
-def extract_and_calculate_utci(ds, time_index):
+def extract_and_calculate_utci(ds, time_index, level_indices=None):
     """
     Extracts required data and calculates UTCI for a given time index without reducing dimensionality.
+    :param level_indices: list of GridsK indices to compute, or None for all levels
     """
-    air_temp = extract_kpi_data(ds, 'T')[time_index]
-    wind_speed = extract_kpi_data(ds, 'WindSpd')[time_index]
-    rel_humidity = extract_kpi_data(ds, 'RelHum')[time_index]
-    mrt = extract_kpi_data(ds, 'TMRT')[time_index]
+    air_temp = extract_kpi_data(ds, 'T', time_index, level_indices)
+    wind_speed = extract_kpi_data(ds, 'WindSpd', time_index, level_indices)
+    rel_humidity = extract_kpi_data(ds, 'RelHum', time_index, level_indices)
+    mrt = extract_kpi_data(ds, 'TMRT', time_index, level_indices)
 
     # Check for any missing values in the input data
     if np.isnan(air_temp).any() or np.isnan(wind_speed).any() or np.isnan(rel_humidity).any() or np.isnan(mrt).any():
@@ -0,0 +1,92 @@
+import numpy as np
+import xarray as xr
+
+from memory_policy import (
+    load_memory_config, load_scenarios, pack_scale_offset, unpack_scale_offset, kpi_stats, kpi_range
+)
+
+POLICY = {
+    'storage_dtype': 'float32',
+    'accumulation_dtype': 'float64',
+    'compress_2d_kpis': False,
+    'packed_dtype': 'int16',
+    'memory_budget_mb': 512
+}
+
+def make_2d_kpi(values):
+    return xr.DataArray(values, dims=('Time', 'GridsJ', 'GridsI'), name='TSurf')
+
+def round_trip(da):
+    packed = pack_scale_offset(da, 'int16')
+    return packed, unpack_scale_offset(packed.values, packed.attrs, np.float32)
+
+def test_pack_round_trip_within_half_scale():
+    rng = np.random.default_rng(0)
+    values = rng.uniform(10.0, 60.0, size=(4, 5, 6))
+    values[1, 2, 3] = np.nan
+    packed, restored = round_trip(make_2d_kpi(values))
+
+    assert packed.dtype == np.int16
+    assert np.isnan(restored[1, 2, 3])
+    valid = ~np.isnan(values)
+    # Allow for the float32 rounding of the restored values
+    tolerance = packed.attrs['packed_scale'] / 2 + np.finfo(np.float32).eps * 60.0
+    assert np.all(np.abs(restored[valid] - values[valid]) <= tolerance)
+
+def test_pack_constant_input():
+    _, restored = round_trip(make_2d_kpi(np.full((3, 2, 2), 25.5)))
+    np.testing.assert_allclose(restored, 25.5)
+
+def test_pack_all_nan_input():
+    _, restored = round_trip(make_2d_kpi(np.full((3, 2, 2), np.nan)))
+    assert np.isnan(restored).all()
+
+def write_scenario(path):
+    ds = xr.Dataset(
+        {
+            'TSurf': (('Time', 'GridsJ', 'GridsI'), np.ones((2, 64, 64), dtype=np.float32)),
+            'T': (('Time', 'GridsK', 'GridsJ', 'GridsI'), np.ones((2, 4, 64, 64), dtype=np.float32))
+        },
+        coords={'GridsK': [0.3, 0.9, 1.5, 2.1]}
+    )
+    ds.to_netcdf(path)
+    # 2 * 64 * 64 * 4 B + 2 * 4 * 64 * 64 * 4 B = 160 KiB of float32 data
+    return (2 * 64 * 64 + 2 * 4 * 64 * 64) * 4
+
+def test_budget_fallback_keeps_second_scenario_lazy(tmp_path, monkeypatch):
+    nbytes = write_scenario(tmp_path / 'statusquo.nc')
+    write_scenario(tmp_path / 'optimized.nc')
+    monkeypatch.setenv('MEMORY_BUDGET_MB', str(1.5 * nbytes / 1024 ** 2))
+
+    datasets = load_scenarios(
+        {'statusquo': tmp_path / 'statusquo.nc', 'optimized': tmp_path / 'optimized.nc'},
+        ['TSurf', 'T'],
+        load_memory_config()
+    )
+
+    assert datasets['statusquo'].attrs['memory_mode'] == 'loaded'
+    assert datasets['statusquo']['T'].dtype == np.float32
+    assert datasets['optimized'].attrs['memory_mode'] == 'lazy'
+
+    # Slice-wise reductions give the same results on the lazy scenario
+    assert kpi_range(datasets['optimized'], 'T', POLICY) == kpi_range(datasets['statusquo'], 'T', POLICY)
+    dims = ['GridsI', 'GridsJ', 'GridsK']
+    for lazy, loaded in zip(kpi_stats(datasets['optimized'], 'T', POLICY, dims),
+                            kpi_stats(datasets['statusquo'], 'T', POLICY, dims)):
+        np.testing.assert_array_equal(lazy, loaded)
+
+def test_kpi_stats_packed_matches_unpacked():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(10.0, 60.0, size=(4, 5, 6))
+    values[0, 0, 0] = np.nan
+    da = make_2d_kpi(values)
+    packed = pack_scale_offset(da, 'int16')
+
+    mean, min_val, max_val = kpi_stats(xr.Dataset({'TSurf': da}), 'TSurf', POLICY, ['GridsI', 'GridsJ'])
+    packed_mean, packed_min, packed_max = kpi_stats(xr.Dataset({'TSurf': packed}), 'TSurf', POLICY, ['GridsI', 'GridsJ'])
+
+    tolerance = packed.attrs['packed_scale']
+    assert mean.shape == (4,)
+    np.testing.assert_allclose(packed_mean, mean, atol=tolerance)
+    np.testing.assert_allclose(packed_min, min_val, atol=tolerance)
+    np.testing.assert_allclose(packed_max, max_val, atol=tolerance)
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from utci_calculator import resolve_levels, extract_kpi_data
+from utci_calculator_4D import extract_kpi_data as extract_kpi_data_4d
+
+# Lowest and highest GridsK levels of the Playground output (see the data exploration notebook)
+GRIDS_K = [0.3, 0.9, 1.5, 2.1, 2.7, 67.5, 70.5, 73.5]
+
+def make_dataset():
+    shape = (2, len(GRIDS_K), 3, 4)
+    return xr.Dataset(
+        {'T': (('Time', 'GridsK', 'GridsJ', 'GridsI'), np.arange(np.prod(shape), dtype=np.float32).reshape(shape))},
+        coords={'GridsK': np.array(GRIDS_K, dtype=np.float32)}
+    )
+
+def test_pedestrian_height_maps_to_nearest_level():
+    assert resolve_levels(make_dataset(), 1.4) == [2]
+
+def test_all_levels():
+    assert resolve_levels(make_dataset(), 'all') == list(range(len(GRIDS_K)))
+
+def test_list_of_heights_is_sorted_and_deduplicated():
+    assert resolve_levels(make_dataset(), [70.0, 1.4, 1.6, 0.3]) == [0, 2, 6]
+
+def test_heights_outside_the_grid_are_rejected():
+    with pytest.raises(ValueError):
+        resolve_levels(make_dataset(), 200.0)
+    with pytest.raises(ValueError):
+        resolve_levels(make_dataset(), -5.0)
+    with pytest.raises(ValueError):
+        resolve_levels(make_dataset(), float('nan'))
+    with pytest.raises(ValueError):
+        resolve_levels(make_dataset(), [])
+
+def test_unknown_level_spec_is_rejected():
+    with pytest.raises(ValueError):
+        resolve_levels(make_dataset(), 'pedestrian')
+
+def test_extract_kpi_data_4d_without_gridsk_ignores_levels():
+    ds = xr.Dataset({'TSurf': (('Time', 'GridsJ', 'GridsI'), np.ones((2, 3, 4)))})
+    assert extract_kpi_data_4d(ds, 'TSurf', 0, [0, 2]).shape == (3, 4)
+
+def test_extract_kpi_data_scalar_index_returns_2d():
+    ds = make_dataset()
+    values = extract_kpi_data(ds, 'T', 1, 2)
+    assert values.shape == (3, 4)
+    np.testing.assert_array_equal(values, ds['T'].values[1, 2])
+
+def test_extract_kpi_data_list_keeps_gridsk():
+    ds = make_dataset()
+    values = extract_kpi_data(ds, 'T', 0, [0, 2])
+    assert values.shape == (2, 3, 4)
+    np.testing.assert_array_equal(values, ds['T'].values[0, [0, 2]])